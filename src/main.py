@@ -6,12 +6,30 @@
 Healthcare Data Transformation
 Transforms legacy healthcare data into a snowflake schema
 """
+import argparse
+import array
+import concurrent.futures
 import csv
 import os
+import sys
 import datetime
-import time
-from collections import defaultdict
-from typing import Dict, List, Any, Optional, Set
+import functools
+import gc
+from collections import namedtuple
+from dataclasses import dataclass, field
+from itertools import compress, islice
+from typing import (
+    Callable,
+    Collection,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Any,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 # Creating output directory if it doesn't exist
 os.makedirs("output", exist_ok=True)
@@ -94,341 +112,628 @@ SCHEMAS = {
     ],
 }
 
-# Precompiled date formats for faster parsing
-DATE_FORMATS = [
-    ("%Y-%m-%d", lambda x: True),  # Standard ISO format
-    ("%m/%d/%Y", lambda x: "/" in x),  # US format with slashes
-    (
-        "%d-%m-%Y",
-        lambda x: "-" in x and len(x.split("-")) == 3,
-    ),  # Day first with hyphens
-    ("%Y/%m/%d", lambda x: "/" in x and len(x) >= 8),  # Year first with slashes
+# Fields generated during normalization rather than read from the source file
+DERIVED_FIELDS = {
+    "patient_status",
+    "provider_id",
+    "location_id",
+    "primary_diagnosis_id",
+    "secondary_diagnosis_id",
+    "treatment_id",
+}
+
+# Integer surrogate keys assigned during normalization (DERIVED_FIELDS minus status)
+SURROGATE_KEY_COLUMNS = frozenset(DERIVED_FIELDS - {"patient_status"})
+
+# Source columns consumed by the processor, in schema order
+SOURCE_COLUMNS = [
+    name
+    for name in dict.fromkeys(f for schema in SCHEMAS.values() for f in schema)
+    if name not in DERIVED_FIELDS
 ]
 
+# Source columns the processor may do without (read as empty when absent);
+# every other source column is required
+OPTIONAL_SOURCE_COLUMNS = frozenset(
+    {
+        "primary_diagnosis_code",
+        "primary_diagnosis_desc",
+        "secondary_diagnosis_code",
+        "secondary_diagnosis_desc",
+        "treatment_code",
+        "treatment_desc",
+        "prescription_id",
+        "prescription_drug_name",
+        "prescription_dosage",
+        "prescription_frequency",
+        "prescription_duration_days",
+        "lab_order_id",
+        "lab_test_code",
+        "lab_name",
+        "lab_result_value",
+        "lab_result_units",
+        "lab_result_date",
+    }
+)
+
+# Source columns of one dataset as attributes, each a sequence in row order
+SourceColumns = namedtuple("SourceColumns", SOURCE_COLUMNS)
+
+# Low-cardinality source columns; their values are interned so repeated
+# values share one string object (and its cached hash)
+INTERNED_COLUMNS = (
+    "visit_type",
+    "patient_gender",
+    "patient_state",
+    "patient_zip",
+    "insurance_payer_name",
+    "insurance_plan_type",
+    "billing_payment_status",
+    "doctor_title",
+    "doctor_department",
+    "clinic_name",
+    "primary_diagnosis_code",
+    "secondary_diagnosis_code",
+    "treatment_code",
+    "prescription_drug_name",
+    "prescription_frequency",
+    "lab_test_code",
+    "lab_result_units",
+)
+
+# Column-oriented view of a CSV file: column name -> values in row order
+Columns = Dict[str, Sequence[str]]
+
+# Date layouts accepted besides canonical YYYY-MM-DD, keyed by separator.
+# Each entry gives the positions of (year, month, day) in the split string,
+# in the order they are tried: %Y-%m-%d, %d-%m-%Y and %m/%d/%Y, %Y/%m/%d
+DATE_LAYOUTS = {
+    "-": ((0, 1, 2), (2, 1, 0)),
+    "/": ((2, 0, 1), (0, 1, 2)),
+}
+
+# Datetime formats tried when fromisoformat rejects a value
+DATETIME_FORMATS = ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M")
+
+# Buffer size (bytes) used when writing output CSV files
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Rows transposed into columns at a time when reading CSV files
+READ_CHUNK_ROWS = 1 << 10
+
 # Define threshold: visits >= this date mean "Active" status
 # No end date needed since check is only for visits from 2022 onwards
 ACTIVE_START_DATE = datetime.datetime(2022, 1, 1)
 
+# Visit times are tracked as whole seconds since this (naive) epoch
+UNIX_EPOCH = datetime.datetime(1970, 1, 1)
+ONE_SECOND = datetime.timedelta(seconds=1)
+ACTIVE_START_EPOCH = (ACTIVE_START_DATE - UNIX_EPOCH) // ONE_SECOND
+
+
+def read_csv_columns(
+    file_path: str,
+    usecols: Optional[Sequence[str]] = None,
+    optional_cols: Collection[str] = (),
+) -> Tuple[List[str], Columns]:
+    """Read a CSV file in one pass and transpose it into columns
+
+    As with csv.DictReader, blank lines are skipped and rows shorter or longer
+    than the header are padded with "" or trimmed. A column of usecols missing
+    from the file raises KeyError unless it is in optional_cols, which are
+    read as all "".
+    """
+    with open(file_path, "r", newline="", encoding="utf-8-sig") as file:
+        reader = csv.reader(file)
+        fieldnames = next(reader, [])
+        width = len(fieldnames)
+        padding = [""] * width
+        positions = {name: i for i, name in enumerate(fieldnames)}
+        wanted = set(positions.values())
+        if usecols is not None:
+            for name in usecols:
+                if name not in positions and name not in optional_cols:
+                    raise KeyError(name)
+            wanted = {positions[name] for name in usecols if name in positions}
+        # Kept columns in file order, lined up with a chunk's transpose
+        kept = [fieldnames[i] for i in sorted(wanted)]
+        selected = [i in wanted for i in range(width)]
+        picked: List[List[str]] = [[] for _ in kept]
+        has_width = width.__eq__
+
+        # Transpose a small chunk of rows at a time in C instead of building a
+        # dict per row; small chunks stay in the CPU cache. The rows can't form
+        # reference cycles, so the cyclic GC is paused meanwhile: left on, the
+        # row lists trigger collections that walk everything read so far
+        row_count = 0
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            while True:
+                rows = list(islice(reader, READ_CHUNK_ROWS))
+                if not rows:
+                    break
+                if not all(map(has_width, map(len, rows))):
+                    rows = [
+                        row if len(row) == width else (row + padding)[:width]
+                        for row in rows
+                        if row
+                    ]
+                    if not rows:
+                        continue
+                row_count += len(rows)
+                for column, values in zip(picked, compress(zip(*rows), selected)):
+                    column.extend(values)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    columns: Columns = dict(zip(kept, picked))
+    if usecols is not None:
+        columns = {name: columns.get(name, ("",) * row_count) for name in usecols}
+    return fieldnames, columns
+
+
+def first_occurrence_indices(values: Sequence[str]) -> List[int]:
+    """Return the index of the first occurrence of each distinct value, in order"""
+    # Walking the values backwards lets earlier rows overwrite later ones,
+    # so the dict ends up holding first occurrences without a Python loop
+    last = len(values) - 1
+    first_seen = dict(zip(reversed(values), range(last, -1, -1)))
+    return sorted(first_seen.values())
+
+
+@functools.lru_cache(maxsize=65536)
+def normalize_date(date_str: str) -> str:
+    """Convert a date string to YYYY-MM-DD, returning it unchanged if unrecognized"""
+    # Already canonical: strptime/strftime would round-trip it unchanged
+    if (
+        len(date_str) == 10
+        and date_str[4] == "-"
+        and date_str[7] == "-"
+        and date_str.isascii()
+    ):
+        return date_str
+
+    separator = "/" if "/" in date_str else "-"
+    parts = date_str.split(separator)
+    if len(parts) != 3 or not all(part.isdigit() for part in parts):
+        return date_str
+
+    # Pick the fields by position instead of trying strptime per format
+    for year_pos, month_pos, day_pos in DATE_LAYOUTS[separator]:
+        year, month, day = parts[year_pos], parts[month_pos], parts[day_pos]
+        if len(year) != 4 or len(month) > 2 or len(day) > 2:
+            continue
+        # strptime takes any Unicode digits in %Y, and in %d after a leading
+        # 1 or 2, but only ASCII digits elsewhere
+        if not month.isascii() or not (day.isascii() or day[0] in "12"):
+            continue
+        try:
+            date = datetime.date(int(year), int(month), int(day))
+        except ValueError:
+            continue
+        # Format the parsed ints, as strftime did, so any digits come out ASCII
+        return f"{date.year:04d}-{date.month:02d}-{date.day:02d}"
+
+    return date_str
+
+
+@functools.lru_cache(maxsize=131072)
+def parse_datetime(datetime_str: str) -> Optional[datetime.datetime]:
+    """Parse datetime string into datetime object for comparison (None if unparseable)"""
+    if not datetime_str:
+        return None
+
+    # Drop fractional seconds once, then try the C-level ISO parser first.
+    # fromisoformat accepts more than the formats below (compact "20220101",
+    # week dates, hour-only times, "," decimals), so it only sees strings
+    # already shaped like YYYY-MM-DD, YYYY-MM-DD[T ]HH:MM:SS or YYYY-MM-DD HH:MM
+    datetime_head = datetime_str.split(".")[0]
+    head_length = len(datetime_head)
+    if (
+        head_length >= 10
+        and datetime_head[4] == "-"
+        and datetime_head[7] == "-"
+        and (
+            len(datetime_str) == 10
+            or (
+                head_length == 19
+                and datetime_head[10] in "T "
+                and datetime_head[13] == ":"
+                and datetime_head[16] == ":"
+            )
+            or (
+                head_length == 16
+                and datetime_head[10] == " "
+                and datetime_head[13] == ":"
+            )
+        )
+    ):
+        try:
+            parsed = datetime.datetime.fromisoformat(datetime_head)
+            if parsed.tzinfo is None:
+                return parsed
+        except ValueError:
+            pass
+
+    # Check for ISO-like formats with a time component
+    if "T" in datetime_str or " " in datetime_str:
+        for fmt in DATETIME_FORMATS:
+            try:
+                return datetime.datetime.strptime(datetime_head, fmt)
+            except ValueError:
+                continue
+
+    # If no time component or above formats didn't match, try date-only formats
+    date_str = normalize_date(datetime_str)
+    try:
+        return datetime.datetime.strptime(date_str, "%Y-%m-%d")
+    except ValueError:
+        # Cached, so the caller warns: a print here would show only once per value
+        return None
+
+
+@dataclass
+class ColumnTable:
+    """Struct-of-arrays store for one output table: a list per column plus a key index"""
+
+    schema: List[str]
+    columns: List[List[Any]] = field(init=False)
+    index: Dict[Hashable, int] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self.columns = [[] for _ in self.schema]
+
+    def __len__(self) -> int:
+        return len(self.columns[0])
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.index
+
+    def append(self, row: Sequence[Any], key: Optional[Hashable] = None) -> int:
+        """Append one row (in schema order) and return its row index"""
+        row_index = len(self.columns[0])
+        for column, value in zip(self.columns, row):
+            column.append(value)
+        if key is not None:
+            self.index[key] = row_index
+        return row_index
+
+    def extend(self, rows: Sequence[Sequence[Any]]) -> None:
+        """Append many rows (in schema order) at once, transposing them in C"""
+        for column, values in zip(self.columns, zip(*rows)):
+            column.extend(values)
+
+    def column(self, name: str) -> List[Any]:
+        """Return the underlying list for a column"""
+        return self.columns[self.schema.index(name)]
+
+    def rows(self) -> Iterator[Tuple[Any, ...]]:
+        """Iterate rows as tuples in schema order"""
+        return zip(*self.columns)
+
 
 class DataProcessor:
     def __init__(self, batch_size: int = 100):
         # Data structures to store normalized data
-        self.patients: Dict[str, Dict[str, Any]] = {}
-        self.insurances: Dict[str, Dict[str, Any]] = {}
-        self.billings: Dict[str, Dict[str, Any]] = {}
-        self.providers: Dict[int, Dict[str, Any]] = {}
-        self.locations: Dict[int, Dict[str, Any]] = {}
-        self.primary_diagnoses: Dict[int, Dict[str, Any]] = {}
-        self.secondary_diagnoses: Dict[int, Dict[str, Any]] = {}
-        self.treatments: Dict[int, Dict[str, Any]] = {}
-        self.prescriptions: Dict[str, Dict[str, Any]] = {}
-        self.lab_orders: Dict[str, Dict[str, Any]] = {}
-        self.visits: List[Dict[str, Any]] = []
+        # (one list per column, see ColumnTable)
+        self.patients = ColumnTable(SCHEMAS["DimPatient"])
+        self.insurances = ColumnTable(SCHEMAS["DimInsurance"])
+        self.billings = ColumnTable(SCHEMAS["DimBilling"])
+        self.providers = ColumnTable(SCHEMAS["DimProvider"])
+        self.locations = ColumnTable(SCHEMAS["DimLocation"])
+        self.primary_diagnoses = ColumnTable(SCHEMAS["DimPrimaryDiagnosis"])
+        self.secondary_diagnoses = ColumnTable(SCHEMAS["DimSecondaryDiagnosis"])
+        self.treatments = ColumnTable(SCHEMAS["DimTreatment"])
+        self.prescriptions = ColumnTable(SCHEMAS["DimPrescription"])
+        self.lab_orders = ColumnTable(SCHEMAS["DimLabOrder"])
+        self.visits = ColumnTable(SCHEMAS["FactVisit"])
 
         # Lookup dictionaries for deduplication
-        self.provider_lookup: Dict[str, int] = {}
-        self.location_lookup: Dict[str, int] = {}
-        self.primary_diagnosis_lookup: Dict[str, int] = {}
-        self.secondary_diagnosis_lookup: Dict[str, int] = {}
-        self.treatment_lookup: Dict[str, int] = {}
+        # (keyed by tuples of the identifying fields; values are the surrogate
+        # IDs pre-formatted as strings, so FactVisit rows need no int -> str)
+        self.provider_lookup: Dict[Tuple[str, str, str], str] = {}
+        self.location_lookup: Dict[Tuple[str, str], str] = {}
+        self.primary_diagnosis_lookup: Dict[Tuple[str, str], str] = {}
+        self.secondary_diagnosis_lookup: Dict[Tuple[str, str], str] = {}
+        self.treatment_lookup: Dict[Tuple[str, str], str] = {}
 
         # Set batch size for processing
         self.batch_size = batch_size
 
-        # Track processed visit IDs to avoid duplicates
-        self.processed_visit_ids: Set[str] = set()
-
-        # Track patient visit dates for determining status
-        self.patient_visit_dates: Dict[str, List[datetime.datetime]] = defaultdict(list)
+        # Append-only visit log for determining status: patient row index and
+        # visit time (epoch seconds) per visit, packed as C ints
+        self.visit_patient_idx = array.array("i")
+        self.visit_epoch = array.array("q")
 
     def parse_date(self, date_str: str) -> str:
         """Parse date string into standard format with optimized format detection"""
         if not date_str:
             return ""
 
-        try:
-            # Skip formats that don't match the pattern
-            for fmt, condition in DATE_FORMATS:
-                if condition(date_str):
-                    try:
-                        return datetime.datetime.strptime(date_str, fmt).strftime(
-                            "%Y-%m-%d"
-                        )
-                    except ValueError:
-                        continue
-            return date_str
-        except Exception:
-            return date_str
-
-    def _parse_datetime(self, datetime_str: str) -> Optional[datetime.datetime]:
-        """Parse datetime string into datetime object for comparison"""
-        if not datetime_str:
-            return None
-
-        try:
-            # Check for ISO format with time component
-            if "T" in datetime_str or " " in datetime_str:
-                # Handle ISO format or space-separated datetime
-                for fmt in ["%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"]:
-                    try:
-                        return datetime.datetime.strptime(
-                            datetime_str.split(".")[0], fmt
-                        )
-                    except ValueError:
-                        continue
+        # Dates repeat heavily across rows, so the cached parser mostly hits
+        return normalize_date(date_str)
+
+    def process_batch(self, cols: SourceColumns, row_indices: Sequence[int]) -> None:
+        """Process a batch of rows given by their indices into the columns"""
+        # Deduplicate the composite-key dimensions column-wise for the batch:
+        # one tight loop per dimension yields an ID per row, in row order.
+        # Providers and locations need every field (missing -> "0"),
+        # diagnoses and treatments need any field (missing -> "").
+        provider_ids = self._factorize(
+            (cols.doctor_name, cols.doctor_title, cols.doctor_department),
+            row_indices,
+            self.provider_lookup,
+            self.providers,
+            all,
+            "0",
+        )
+        location_ids = self._factorize(
+            (cols.clinic_name, cols.room_number),
+            row_indices,
+            self.location_lookup,
+            self.locations,
+            all,
+            "0",
+        )
+        primary_diagnosis_ids = self._factorize(
+            (cols.primary_diagnosis_code, cols.primary_diagnosis_desc),
+            row_indices,
+            self.primary_diagnosis_lookup,
+            self.primary_diagnoses,
+            any,
+            "",
+        )
+        secondary_diagnosis_ids = self._factorize(
+            (cols.secondary_diagnosis_code, cols.secondary_diagnosis_desc),
+            row_indices,
+            self.secondary_diagnosis_lookup,
+            self.secondary_diagnoses,
+            any,
+            "",
+        )
+        treatment_ids = self._factorize(
+            (cols.treatment_code, cols.treatment_desc),
+            row_indices,
+            self.treatment_lookup,
+            self.treatments,
+            any,
+            "",
+        )
 
-            # If no time component or above formats didn't match, try date-only formats
-            date_str = self.parse_date(datetime_str)
-            if date_str:
-                return datetime.datetime.strptime(date_str, "%Y-%m-%d")
-        except Exception as e:
-            print(f"⚠️ Could not parse date '{datetime_str}': {e}")
+        # Flag the rows with any prescription / lab order data in one C-level
+        # pass per table, so empty rows are skipped without per-field checks
+        has_prescription_data = self._has_any(
+            (
+                cols.prescription_drug_name,
+                cols.prescription_dosage,
+                cols.prescription_frequency,
+                cols.prescription_duration_days,
+            ),
+            row_indices,
+        )
+        has_lab_order_data = self._has_any(
+            (
+                cols.lab_test_code,
+                cols.lab_name,
+                cols.lab_result_value,
+                cols.lab_result_units,
+                cols.lab_result_date,
+            ),
+            row_indices,
+        )
 
-        return None
+        # Hoist column, attribute and method lookups out of the row loop
+        patient_ids = cols.patient_id
+        visit_ids = cols.visit_id
+        visit_datetimes = cols.visit_datetime
+        visit_types = cols.visit_type
+        patient_index = self.patients.index
+        visit_patient_idx_append = self.visit_patient_idx.append
+        visit_epoch_append = self.visit_epoch.append
+        # Fact rows are collected as plain tuples and moved into the
+        # FactVisit columns in one transpose at the end of the batch
+        visit_rows: List[Tuple[str, ...]] = []
+        visit_rows_append = visit_rows.append
+        parse_dt = parse_datetime
+        process_patient = self._process_patient
+        process_insurance = self._process_insurance
+        process_billing = self._process_billing
+        process_prescription = self._process_prescription
+        process_lab_order = self._process_lab_order
+
+        for (
+            i,
+            provider_id,
+            location_id,
+            primary_diagnosis_id,
+            secondary_diagnosis_id,
+            treatment_id,
+            has_prescription,
+            has_lab_order,
+        ) in zip(
+            row_indices,
+            provider_ids,
+            location_ids,
+            primary_diagnosis_ids,
+            secondary_diagnosis_ids,
+            treatment_ids,
+            has_prescription_data,
+            has_lab_order_data,
+        ):
+            # Extract fields once for efficiency
+            patient_id = patient_ids[i]
+            visit_datetime = visit_datetimes[i]
+
+            # Process patient dimensions only if new
+            patient_idx = patient_index.get(patient_id)
+            if patient_idx is None:
+                patient_idx = process_patient(cols, i, patient_id)
+
+            # Track visit date for patient status calculation
+            visit_date = parse_dt(visit_datetime)
+            if visit_date:
+                visit_patient_idx_append(patient_idx)
+                visit_epoch_append((visit_date - UNIX_EPOCH) // ONE_SECOND)
+            else:
+                if visit_datetime:
+                    print(f"⚠️ Could not parse date '{visit_datetime}'")
+                print(
+                    f" ⚠️ Could not parse visit date '{visit_datetime}' for patient {patient_id}"
+                )
 
-    def process_batch(self, batch: List[Dict[str, str]]) -> None:
-        """Process a batch of rows"""
-        for row in batch:
-            self._process_row(row)
-
-    def _process_row(self, row: Dict[str, str]) -> None:
-        """Process a single row of data"""
-        # Extract fields once for efficiency
-        patient_id = row["patient_id"]
-        visit_id = row["visit_id"]
-        visit_datetime = row["visit_datetime"]
-
-        # Skip already processed visit IDs (deduplication)
-        if visit_id in self.processed_visit_ids:
-            return
-        self.processed_visit_ids.add(visit_id)
-
-        # Process patient dimensions only if new
-        if patient_id not in self.patients:
-            self._process_patient(row, patient_id)
-
-        # Track visit date for patient status calculation
-        visit_date = self._parse_datetime(visit_datetime)
-        if visit_date:
-            self.patient_visit_dates[patient_id].append(visit_date)
-        else:
-            print(
-                f" ⚠️ Could not parse visit date '{visit_datetime}' for patient {patient_id}"
+            # Process related dimensions
+            insurance_id = process_insurance(cols, i, patient_id)
+            billing_id = process_billing(cols, i, insurance_id)
+
+            # Add visit fact
+            visit_rows_append(
+                (
+                    visit_ids[i],
+                    patient_id,
+                    insurance_id,
+                    billing_id,
+                    provider_id,
+                    location_id,
+                    primary_diagnosis_id,
+                    secondary_diagnosis_id,
+                    treatment_id,
+                    process_prescription(cols, i, has_prescription),
+                    process_lab_order(cols, i, has_lab_order),
+                    visit_datetime,
+                    visit_types[i],
+                )
             )
 
-        # Process related dimensions
-        insurance_id = self._process_insurance(row, patient_id)
-        billing_id = self._process_billing(row, insurance_id)
-        provider_id = self._process_provider(row)
-        location_id = self._process_location(row)
-        primary_diagnosis_id = self._process_primary_diagnosis(row)
-        secondary_diagnosis_id = self._process_secondary_diagnosis(row)
-        treatment_id = self._process_treatment(row)
-        prescription_id = self._process_prescription(row)
-        lab_order_id = self._process_lab_order(row)
-
-        # Add visit fact
-        self.visits.append(
-            {
-                "visit_id": visit_id,
-                "patient_id": patient_id,
-                "insurance_id": insurance_id,
-                "billing_id": billing_id,
-                "provider_id": provider_id,
-                "location_id": location_id,
-                "primary_diagnosis_id": primary_diagnosis_id,
-                "secondary_diagnosis_id": secondary_diagnosis_id,
-                "treatment_id": treatment_id,
-                "prescription_id": prescription_id,
-                "lab_order_id": lab_order_id,
-                "visit_datetime": visit_datetime,
-                "visit_type": row["visit_type"],
-            }
+        self.visits.extend(visit_rows)
+
+    def _factorize(
+        self,
+        key_columns: Sequence[Sequence[str]],
+        row_indices: Sequence[int],
+        lookup: Dict[Tuple[str, ...], str],
+        table: ColumnTable,
+        is_present: Callable[[Tuple[str, ...]], bool],
+        missing_id: str,
+    ) -> List[str]:
+        """Map each row's dimension key to its surrogate ID, adding new keys"""
+        # Gather the key tuples for the batch with C-level iteration
+        keys = zip(*(map(column.__getitem__, row_indices) for column in key_columns))
+
+        lookup_get = lookup.get
+        ids: List[str] = []
+        ids_append = ids.append
+        for key in keys:
+            # Skip processing if the required fields are missing
+            if not is_present(key):
+                ids_append(missing_id)
+                continue
+
+            key_id = lookup_get(key)
+            if key_id is None:
+                row_index = table.append((len(table) + 1, *key))
+                key_id = lookup[key] = str(row_index + 1)
+            ids_append(key_id)
+        return ids
+
+    def _has_any(
+        self, columns: Sequence[Sequence[str]], row_indices: Sequence[int]
+    ) -> List[bool]:
+        """Flag each row that has a non-empty value in any of the columns"""
+        fields = zip(*(map(column.__getitem__, row_indices) for column in columns))
+        return list(map(any, fields))
+
+    def _process_patient(self, cols: SourceColumns, i: int, patient_id: str) -> int:
+        """Process patient data and return the patient's row index"""
+        return self.patients.append(
+            (
+                patient_id,
+                cols.patient_first_name[i],
+                cols.patient_last_name[i],
+                self.parse_date(cols.patient_date_of_birth[i]),
+                cols.patient_gender[i],
+                cols.patient_address_line1[i],
+                cols.patient_address_line2[i],
+                cols.patient_city[i],
+                cols.patient_state[i],
+                cols.patient_zip[i],
+                cols.patient_phone[i],
+                cols.patient_email[i],
+                "Active",  # Default status, will be updated later
+            ),
+            key=patient_id,
         )
 
-    def _process_patient(self, row: Dict[str, str], patient_id: str) -> None:
-        """Process patient data"""
-        self.patients[patient_id] = {
-            "patient_id": patient_id,
-            "patient_first_name": row["patient_first_name"],
-            "patient_last_name": row["patient_last_name"],
-            "patient_date_of_birth": self.parse_date(row["patient_date_of_birth"]),
-            "patient_gender": row["patient_gender"],
-            "patient_address_line1": row["patient_address_line1"],
-            "patient_address_line2": row["patient_address_line2"],
-            "patient_city": row["patient_city"],
-            "patient_state": row["patient_state"],
-            "patient_zip": row["patient_zip"],
-            "patient_phone": row["patient_phone"],
-            "patient_email": row["patient_email"],
-            "patient_status": "Active",  # Default status, will be updated later
-        }
-
-    def _process_insurance(self, row: Dict[str, str], patient_id: str) -> str:
+    def _process_insurance(self, cols: SourceColumns, i: int, patient_id: str) -> str:
         """Process insurance data"""
-        insurance_id = row["insurance_id"]
+        insurance_id = cols.insurance_id[i]
         if insurance_id and insurance_id not in self.insurances:
-            self.insurances[insurance_id] = {
-                "insurance_id": insurance_id,
-                "patient_id": patient_id,
-                "insurance_payer_name": row["insurance_payer_name"],
-                "insurance_policy_number": row["insurance_policy_number"],
-                "insurance_group_number": row["insurance_group_number"],
-                "insurance_plan_type": row["insurance_plan_type"],
-            }
+            self.insurances.append(
+                (
+                    insurance_id,
+                    patient_id,
+                    cols.insurance_payer_name[i],
+                    cols.insurance_policy_number[i],
+                    cols.insurance_group_number[i],
+                    cols.insurance_plan_type[i],
+                ),
+                key=insurance_id,
+            )
         return insurance_id
 
-    def _process_billing(self, row: Dict[str, str], insurance_id: str) -> str:
+    def _process_billing(self, cols: SourceColumns, i: int, insurance_id: str) -> str:
         """Process billing data"""
-        billing_id = row["billing_id"]
+        billing_id = cols.billing_id[i]
         if billing_id and billing_id not in self.billings:
             # Convert billing amounts to decimal (float) with safe conversion
-            billing_amount_paid = self._safe_float(row["billing_amount_paid"])
-            billing_total_charge = self._safe_float(row["billing_total_charge"])
-
-            self.billings[billing_id] = {
-                "billing_id": billing_id,
-                "insurance_id": insurance_id,
-                "billing_amount_paid": billing_amount_paid,
-                "billing_total_charge": billing_total_charge,
-                "billing_date": self.parse_date(row["billing_date"]),
-                "billing_payment_status": row["billing_payment_status"],
-            }
+            billing_amount_paid = self._safe_float(cols.billing_amount_paid[i])
+            billing_total_charge = self._safe_float(cols.billing_total_charge[i])
+
+            self.billings.append(
+                (
+                    billing_id,
+                    insurance_id,
+                    billing_amount_paid,
+                    billing_total_charge,
+                    self.parse_date(cols.billing_date[i]),
+                    cols.billing_payment_status[i],
+                ),
+                key=billing_id,
+            )
         return billing_id
 
     def _safe_float(self, value: str) -> float:
         """Safely convert value to float"""
+        # Empty cells are common; answer them without raising an exception
+        if not value or value.isspace():
+            return 0.0
         try:
-            return float(value) if value else 0.0
+            return float(value)
         except (ValueError, TypeError):
             return 0.0
 
-    def _process_provider(self, row: Dict[str, str]) -> int:
-        """Process provider data with efficient lookup"""
-        doctor_name = row["doctor_name"]
-        doctor_title = row["doctor_title"]
-        doctor_department = row["doctor_department"]
-
-        # Skip processing if any required field is missing
-        if not (doctor_name and doctor_title and doctor_department):
-            return 0  # Return 0 for missing data
-
-        # Create a hash key for lookup
-        doctor_key = f"{doctor_name}|{doctor_title}|{doctor_department}"
-
-        if doctor_key not in self.provider_lookup:
-            provider_id = len(self.providers) + 1
-            self.provider_lookup[doctor_key] = provider_id
-            self.providers[provider_id] = {
-                "provider_id": provider_id,
-                "doctor_name": doctor_name,
-                "doctor_title": doctor_title,
-                "doctor_department": doctor_department,
-            }
-        return self.provider_lookup[doctor_key]
-
-    def _process_location(self, row: Dict[str, str]) -> int:
-        """Process location data with efficient lookup"""
-        clinic_name = row["clinic_name"]
-        room_number = row["room_number"]
-
-        # Skip processing if any required field is missing
-        if not (clinic_name and room_number):
-            return 0  # Return 0 for missing data
-
-        location_key = f"{clinic_name}|{room_number}"
-
-        if location_key not in self.location_lookup:
-            location_id = len(self.locations) + 1
-            self.location_lookup[location_key] = location_id
-            self.locations[location_id] = {
-                "location_id": location_id,
-                "clinic_name": clinic_name,
-                "room_number": room_number,
-            }
-        return self.location_lookup[location_key]
-
-    def _process_primary_diagnosis(self, row: Dict[str, str]) -> str:
-        """Process primary diagnosis data"""
-        primary_diagnosis_code = row.get("primary_diagnosis_code", "")
-        primary_diagnosis_desc = row.get("primary_diagnosis_desc", "")
-
-        if not (primary_diagnosis_code or primary_diagnosis_desc):
-            return ""
-
-        primary_diagnosis_key = f"{primary_diagnosis_code}|{primary_diagnosis_desc}"
-
-        if primary_diagnosis_key not in self.primary_diagnosis_lookup:
-            primary_diagnosis_id = len(self.primary_diagnoses) + 1
-            self.primary_diagnosis_lookup[primary_diagnosis_key] = primary_diagnosis_id
-            self.primary_diagnoses[primary_diagnosis_id] = {
-                "primary_diagnosis_id": primary_diagnosis_id,
-                "primary_diagnosis_code": primary_diagnosis_code,
-                "primary_diagnosis_desc": primary_diagnosis_desc,
-            }
-        return str(self.primary_diagnosis_lookup[primary_diagnosis_key])
-
-    def _process_secondary_diagnosis(self, row: Dict[str, str]) -> str:
-        """Process secondary diagnosis data"""
-        secondary_diagnosis_code = row.get("secondary_diagnosis_code", "")
-        secondary_diagnosis_desc = row.get("secondary_diagnosis_desc", "")
-
-        if not (secondary_diagnosis_code or secondary_diagnosis_desc):
-            return ""
-
-        secondary_diagnosis_key = (
-            f"{secondary_diagnosis_code}|{secondary_diagnosis_desc}"
-        )
-
-        if secondary_diagnosis_key not in self.secondary_diagnosis_lookup:
-            secondary_diagnosis_id = len(self.secondary_diagnoses) + 1
-            self.secondary_diagnosis_lookup[secondary_diagnosis_key] = (
-                secondary_diagnosis_id
-            )
-            self.secondary_diagnoses[secondary_diagnosis_id] = {
-                "secondary_diagnosis_id": secondary_diagnosis_id,
-                "secondary_diagnosis_code": secondary_diagnosis_code,
-                "secondary_diagnosis_desc": secondary_diagnosis_desc,
-            }
-        return str(self.secondary_diagnosis_lookup[secondary_diagnosis_key])
-
-    def _process_treatment(self, row: Dict[str, str]) -> str:
-        """Process treatment data"""
-        treatment_code = row.get("treatment_code", "")
-        treatment_desc = row.get("treatment_desc", "")
-
-        if not (treatment_code or treatment_desc):
-            return ""
-
-        treatment_key = f"{treatment_code}|{treatment_desc}"
-
-        if treatment_key not in self.treatment_lookup:
-            treatment_id = len(self.treatments) + 1
-            self.treatment_lookup[treatment_key] = treatment_id
-            self.treatments[treatment_id] = {
-                "treatment_id": treatment_id,
-                "treatment_code": treatment_code,
-                "treatment_desc": treatment_desc,
-            }
-        return str(self.treatment_lookup[treatment_key])
-
-    def _process_prescription(self, row: Dict[str, str]) -> str:
-        """Process prescription data"""
-        prescription_id = row.get("prescription_id", "")
+    def _process_prescription(self, cols: SourceColumns, i: int, has_data: bool) -> str:
+        """Process prescription data (has_data: any prescription field is set)"""
+        prescription_id = cols.prescription_id[i]
 
         if not prescription_id:
             return ""
 
         if prescription_id not in self.prescriptions:
+            # Rows with every prescription field empty have no valid data
+            if not has_data:
+                return ""
+
             # Only process if we have some valid data
-            prescription_drug_name = row.get("prescription_drug_name", "")
-            prescription_dosage = row.get("prescription_dosage", "")
-            prescription_frequency = row.get("prescription_frequency", "")
+            prescription_drug_name = cols.prescription_drug_name[i]
+            prescription_dosage = cols.prescription_dosage[i]
+            prescription_frequency = cols.prescription_frequency[i]
 
             # Safe conversion for duration
             try:
                 prescription_duration_days = int(
-                    float(row.get("prescription_duration_days", 0))
+                    float(cols.prescription_duration_days[i])
                 )
             except (ValueError, TypeError):
                 prescription_duration_days = 0
@@ -440,88 +745,64 @@ class DataProcessor:
                 or prescription_frequency
                 or prescription_duration_days
             ):
-                self.prescriptions[prescription_id] = {
-                    "prescription_id": prescription_id,
-                    "prescription_drug_name": prescription_drug_name,
-                    "prescription_dosage": prescription_dosage,
-                    "prescription_frequency": prescription_frequency,
-                    "prescription_duration_days": prescription_duration_days,
-                }
+                self.prescriptions.append(
+                    (
+                        prescription_id,
+                        prescription_drug_name,
+                        prescription_dosage,
+                        prescription_frequency,
+                        prescription_duration_days,
+                    ),
+                    key=prescription_id,
+                )
             else:
                 # No valid data
                 return ""
 
         return prescription_id
 
-    def _process_lab_order(self, row: Dict[str, str]) -> str:
-        """Process lab order data"""
-        lab_order_id = row.get("lab_order_id", "")
+    def _process_lab_order(self, cols: SourceColumns, i: int, has_data: bool) -> str:
+        """Process lab order data (has_data: any lab order field is set)"""
+        lab_order_id = cols.lab_order_id[i]
 
         if not lab_order_id:
             return ""
 
         if lab_order_id not in self.lab_orders:
-            # Check if we have some valid data
-            lab_test_code = row.get("lab_test_code", "")
-            lab_name = row.get("lab_name", "")
-            lab_result_value = row.get("lab_result_value", "")
-            lab_result_units = row.get("lab_result_units", "")
-            lab_result_date = row.get("lab_result_date", "")
-
             # Only add if we have at least one field with data
-            if (
-                lab_test_code
-                or lab_name
-                or lab_result_value
-                or lab_result_units
-                or lab_result_date
-            ):
-                self.lab_orders[lab_order_id] = {
-                    "lab_order_id": lab_order_id,
-                    "lab_test_code": lab_test_code,
-                    "lab_name": lab_name,
-                    "lab_result_value": lab_result_value,
-                    "lab_result_units": lab_result_units,
-                    "lab_result_date": self.parse_date(lab_result_date),
-                }
-            else:
+            if not has_data:
                 # No valid data
                 return ""
 
+            self.lab_orders.append(
+                (
+                    lab_order_id,
+                    cols.lab_test_code[i],
+                    cols.lab_name[i],
+                    cols.lab_result_value[i],
+                    cols.lab_result_units[i],
+                    self.parse_date(cols.lab_result_date[i]),
+                ),
+                key=lab_order_id,
+            )
+
         return lab_order_id
 
     def _update_patient_statuses(self) -> None:
         """Update patient statuses based on visit dates"""
         print("\n🏁 Updating patient statuses based on visits from 2022 onwards\n")
-        # time.sleep(1)  # 1 second delay
-        active_count = 0
-        inactive_count = 0
-
-        for patient_id, visits in self.patient_visit_dates.items():
-            # Check if patient has any visits in 2022 or later
-            has_recent_visits = False
+        patient_status = self.patients.column("patient_status")
 
-            for visit_date in visits:
-                # Ensure visit_date is a datetime object for comparison
-                # Check if visit is on or after Jan 1, 2022
-                if visit_date and visit_date >= ACTIVE_START_DATE:
-                    has_recent_visits = True
-                    break
+        # Patients with a visit in 2022 or later, built by C-level iteration
+        # over the packed visit log
+        is_recent = map(ACTIVE_START_EPOCH.__le__, self.visit_epoch)
+        recent_patients = set(compress(self.visit_patient_idx, is_recent))
 
-            # Update patient status based on visit activity
-            if patient_id in self.patients:
-                status = "Active" if has_recent_visits else "Inactive"
-                self.patients[patient_id]["patient_status"] = status
-                if status == "Active":
-                    active_count += 1
-                else:
-                    inactive_count += 1
-
-        # For any patients that don't have visit records at all, mark as Inactive
-        for patient_id in self.patients:
-            if patient_id not in self.patient_visit_dates:
-                self.patients[patient_id]["patient_status"] = "Inactive"
-                inactive_count += 1
+        # Everyone starts Inactive (including patients without any visit
+        # records), then a single pass marks the recently active ones
+        patient_status[:] = ["Inactive"] * len(patient_status)
+        for patient_idx in recent_patients:
+            patient_status[patient_idx] = "Active"
 
     def process_data(self) -> None:
         """Process the legacy healthcare data CSV file with batch processing"""
@@ -535,54 +816,54 @@ class DataProcessor:
         )
 
         print(f" 🔍 dataset at: {dataset_path}")
-        # time.sleep(1)  # 1 second delay
-
-        # Process in batches for better memory usage
-        with open(dataset_path, "r", encoding="utf-8") as file:
-            reader = csv.DictReader(file)
-
-            # Print column info
-            if reader.fieldnames:
-                print("\nAvailable columns in CSV file:")
-                for column in reader.fieldnames:
-                    print(f"  • {column}")
-                    time.sleep(0.1)  # 0.1 second delay per column
-                
-                # Display total column count with a delay
-                column_count = len(reader.fieldnames)
-                print(f"\nColumn total count: {column_count}")
-                time.sleep(0.2)  # 0.2 second delay for column count
-            else:
-                print("\nCould not read columns from the CSV.")
 
-            # Process in batches
-            batch = []
-            total_rows = 0
+        # Read the whole file column-wise, keeping only the columns we use
+        fieldnames, columns = read_csv_columns(
+            dataset_path, usecols=SOURCE_COLUMNS, optional_cols=OPTIONAL_SOURCE_COLUMNS
+        )
+
+        # Print column info
+        if fieldnames:
+            print("\nAvailable columns in CSV file:")
+            for column in fieldnames:
+                print(f"  • {column}")
+
+            # Display total column count
+            column_count = len(fieldnames)
+            print(f"\nColumn total count: {column_count}")
+        else:
+            print("\nCould not read columns from the CSV.")
+
+        # Collapse repeated values of low-cardinality columns to one object
+        for column in INTERNED_COLUMNS:
+            columns[column] = tuple(map(sys.intern, columns[column]))
 
-            for row in reader:
-                batch.append(row)
-                total_rows += 1
+        # Fixed-slot access (cols.patient_id[i]) instead of keyed lookups per row
+        cols = SourceColumns(**columns)
 
-                if len(batch) >= self.batch_size:
-                    self.process_batch(batch)
-                    print(f"  ◊ Processed {total_rows} rows...")
-                    batch = []  # Clear the batch
+        # Only the first row of each visit ID is processed (deduplication)
+        total_rows = len(cols.visit_id)
+        row_indices = first_occurrence_indices(cols.visit_id)
 
-            # Process any remaining rows
-            if batch:
-                self.process_batch(batch)
+        # Process in batches of row indices
+        for start in range(0, len(row_indices), self.batch_size):
+            batch = row_indices[start : start + self.batch_size]
+            self.process_batch(cols, batch)
 
-            # Update patient statuses based on visit dates
-            self._update_patient_statuses()
-            self.total_rows = total_rows
+            if len(batch) >= self.batch_size:
+                print(f"  ◊ Processed {start + len(batch)} rows...")
+
+        # Update patient statuses based on visit dates
+        self._update_patient_statuses()
+        self.total_rows = total_rows
 
     def _get_patient_status_summary(self) -> str:
         """Get summary of patient statuses"""
         active_count = 0
         inactive_count = 0
 
-        for patient in self.patients.values():
-            if patient["patient_status"] == "Active":
+        for status in self.patients.column("patient_status"):
+            if status == "Active":
                 active_count += 1
             else:
                 inactive_count += 1
@@ -591,56 +872,111 @@ class DataProcessor:
 
     def write_csv_files(self) -> None:
         """Write all tables to CSV files with efficient writing"""
+        self._write_tables(self._write_csv_optimized)
+
+    def write_parquet_files(self) -> None:
+        """Write all tables to zstd-compressed Parquet files (requires pyarrow)"""
+        self._write_tables(self._write_parquet)
+
+    def _write_tables(self, write_table: Callable[[str, ColumnTable], str]) -> None:
+        """Write every output table with the given per-table writer"""
         # Define table data mapping
         tables = {
-            "DimPatient": list(self.patients.values()),
-            "DimInsurance": list(self.insurances.values()),
-            "DimBilling": list(self.billings.values()),
-            "DimProvider": list(self.providers.values()),
-            "DimLocation": list(self.locations.values()),
-            "DimPrimaryDiagnosis": list(self.primary_diagnoses.values()),
-            "DimSecondaryDiagnosis": list(self.secondary_diagnoses.values()),
-            "DimTreatment": list(self.treatments.values()),
-            "DimPrescription": list(self.prescriptions.values()),
-            "DimLabOrder": list(self.lab_orders.values()),
+            "DimPatient": self.patients,
+            "DimInsurance": self.insurances,
+            "DimBilling": self.billings,
+            "DimProvider": self.providers,
+            "DimLocation": self.locations,
+            "DimPrimaryDiagnosis": self.primary_diagnoses,
+            "DimSecondaryDiagnosis": self.secondary_diagnoses,
+            "DimTreatment": self.treatments,
+            "DimPrescription": self.prescriptions,
+            "DimLabOrder": self.lab_orders,
             "FactVisit": self.visits,
         }
 
-        # Write each table
-        for table_name, data in tables.items():
-            self._write_csv_optimized(table_name, data)
+        # Each table writes its own file from its own columns, so the writes
+        # need no locking and overlap while file I/O releases the GIL
+        max_workers = min(len(tables), os.cpu_count() or 1)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as ex:
+            # Results come back in table order, keeping the log deterministic
+            for message in ex.map(lambda item: write_table(*item), tables.items()):
+                print(message)
+
+    def _write_parquet(self, table_name: str, data: ColumnTable) -> str:
+        """Write a table to a Parquet file and return a status message"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not len(data):
+            return f"Warning: No data for {table_name}"
+
+        # The columns map directly onto Arrow arrays, no per-row formatting.
+        # Surrogate keys are ints in their dimensions but pre-formatted strings
+        # in FactVisit, so both sides are written as int64 (missing -> null)
+        # and the tables join without casts
+        arrays = []
+        for name, column in zip(data.schema, data.columns):
+            if name in SURROGATE_KEY_COLUMNS:
+                keys = [int(value) if value != "" else None for value in column]
+                arrays.append(pa.array(keys, type=pa.int64()))
+            else:
+                arrays.append(pa.array(column))
+        table = pa.Table.from_arrays(arrays, names=data.schema)
+        pq.write_table(table, f"output/{table_name}.parquet", compression="zstd")
 
-    def _write_csv_optimized(self, table_name: str, data: List[Dict[str, Any]]) -> None:
-        """Write a table to a CSV file with optimized writing"""
-        if not data:
-            print(f"Warning: No data for {table_name}")
-            return
+        return f"✅ Created {table_name}.parquet with {len(data)} rows"
+
+    def _write_csv_optimized(self, table_name: str, data: ColumnTable) -> str:
+        """Write a table to a CSV file and return a status message"""
+        if not len(data):
+            return f"Warning: No data for {table_name}"
 
         schema = SCHEMAS[table_name]
         output_file = f"output/{table_name}.csv"
 
-        # Use an in-memory buffer for faster IO
-        with open(output_file, "w", newline="", encoding="utf-8") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=schema)
-            writer.writeheader()
+        # A large write buffer amortizes write syscalls over many rows
+        with open(
+            output_file,
+            "w",
+            buffering=WRITE_BUFFER_SIZE,
+            newline="",
+            encoding="utf-8",
+        ) as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(schema)
 
-            # Filter rows in batches and write
-            for row in data:
-                # Optimize by doing a single comprehension
-                filtered_row = {k: row.get(k, "") for k in schema}
-                writer.writerow(filtered_row)
+            # Columns are zipped back into rows already in schema order
+            writer.writerows(data.rows())
 
-        print(f"✅ Created {table_name}.csv with {len(data)} rows")
-        # time.sleep(0.4)  # 0.2 second delay after showing created file
+        return f"✅ Created {table_name}.csv with {len(data)} rows"
 
 
 def main():
     """Main execution function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--format",
+        choices=("csv", "parquet"),
+        default="csv",
+        help="output file format (parquet requires pyarrow)",
+    )
+    args = parser.parse_args()
+
+    # Fail before processing rather than after if Parquet can't be written
+    if args.format == "parquet":
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            sys.exit("❌ Error: --format=parquet requires pyarrow to be installed")
+
     print("\n\n🏁 Starting healthcare data transformation...\n")
-    # time.sleep(2)  # 2 second delay
     processor = DataProcessor(batch_size=5000)
     processor.process_data()
-    processor.write_csv_files()
+    if args.format == "parquet":
+        processor.write_parquet_files()
+    else:
+        processor.write_csv_files()
     print(f"\nPatient status summary: {processor._get_patient_status_summary()}")
     print("\n•••• Transformation complete. Files saved to 'output' directory. ••••\n")
 
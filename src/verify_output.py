@@ -3,13 +3,87 @@ CSV Output Verification Script
 Validates the generated CSV files against requirements
 """
 import os
-import csv
 import sys
-from typing import Dict, List, Set, Any
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import compress, islice, repeat
+from operator import and_, eq, itemgetter
+from typing import Dict, FrozenSet, Hashable, List, Optional, Sequence, Set, Tuple, Any
 
 # Import schemas from main.py
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from main import SCHEMAS
+from main import SCHEMAS, read_csv_columns
+
+# Foreign key relationships (table: {fk_column: referenced_table})
+FOREIGN_KEYS = {
+    "FactVisit": {
+        "patient_id": "DimPatient",
+        "insurance_id": "DimInsurance",
+        "billing_id": "DimBilling",
+        "provider_id": "DimProvider",
+        "location_id": "DimLocation",
+        "primary_diagnosis_id": "DimPrimaryDiagnosis",
+        "secondary_diagnosis_id": "DimSecondaryDiagnosis",
+        "treatment_id": "DimTreatment",
+        "prescription_id": "DimPrescription",
+        "lab_order_id": "DimLabOrder"
+    }
+}
+# Tables whose primary keys some foreign key refers to
+_REFERENCED_TABLES = frozenset(ref for relations in FOREIGN_KEYS.values() for ref in relations.values())
+
+# Patient fields compared with the original data (patient_status is derived)
+_PATIENT_COMPARE_FIELDS = tuple(field for field in SCHEMAS["DimPatient"] if field != "patient_status")
+
+# Primary key column of each table (the first field of its schema)
+_PK_FIELD = {table: schema[0] for table, schema in SCHEMAS.items()}
+
+# Dimension tables keyed by a combination of source fields rather than a source ID
+_COMPOSITE_TABLES = frozenset({"DimProvider", "DimLocation", "DimPrimaryDiagnosis", "DimSecondaryDiagnosis", "DimTreatment"})
+# Original data key and key fields of each composite-key table
+_COMPOSITE_MAP = {
+    "DimProvider": ("providers", ["doctor_name", "doctor_title", "doctor_department"]),
+    "DimLocation": ("locations", ["clinic_name", "room_number"]),
+    "DimPrimaryDiagnosis": ("primary_diagnoses", ["primary_diagnosis_code", "primary_diagnosis_desc"]),
+    "DimSecondaryDiagnosis": ("secondary_diagnoses", ["secondary_diagnosis_code", "secondary_diagnosis_desc"]),
+    "DimTreatment": ("treatments", ["treatment_code", "treatment_desc"])
+}
+# Pulls a composite table's key fields out of a row in schema order, by position
+_COMPOSITE_KEY_GETTERS = {
+    table: itemgetter(*(SCHEMAS[table].index(field) for field in fields))
+    for table, (_, fields) in _COMPOSITE_MAP.items()
+}
+# Original data keys of the tables whose IDs come straight from the source
+_ORIGINAL_KEYS = {
+    "DimPatient": "patients",
+    "DimInsurance": "insurances",
+    "DimBilling": "billings",
+    "FactVisit": "visits",
+    "DimPrescription": "prescriptions",
+    "DimLabOrder": "lab_orders"
+}
+
+def scan_output_file(file_path: str, schema: List[str], fk_relations: Dict[str, str]) -> Dict[str, Any]:
+    """Parse an output CSV once and collect everything the verification checks need"""
+    headers, columns = read_csv_columns(file_path)
+    
+    # Primary key type is judged from the first row, the key set feeds referential integrity
+    pk_values = columns.get(schema[0], ())
+    pk_type = None
+    if pk_values:
+        try:
+            int(pk_values[0])
+            pk_type = "integer"
+        except ValueError:
+            pk_type = "string"
+    
+    return {
+        "headers": headers,
+        "columns": columns,
+        "pk_type": pk_type,
+        "pk_set": {value for value in pk_values if value},
+        "fk_columns": {column: columns[column] for column in fk_relations if column in columns},
+    }
 
 def verify_csv_files():
     """Verify all generated CSV files meet requirements"""
@@ -20,8 +94,10 @@ def verify_csv_files():
         print("❌ Error: Output directory not found!")
         return False
     
-    # Get all CSV files in the output directory
-    csv_files = [f for f in os.listdir(output_dir) if f.endswith('.csv')]
+    # Get all CSV files in the output directory in one scan, mapped to their paths
+    with os.scandir(output_dir) as entries:
+        csv_files = {entry.name: entry.path for entry in entries
+                     if entry.name.endswith('.csv') and entry.is_file()}
     
     # Check if we have exactly 11 CSV files
     if len(csv_files) != 11:
@@ -36,84 +112,201 @@ def verify_csv_files():
         print("❌ Error: Could not load original data for comparison")
         return False
     
-    # Verify each CSV file against its schema
+    # Verify each CSV file against its schema. Tables are independent once the
+    # original data is loaded, so they are checked in parallel worker processes
+    # that each receive the original data once, through the pool initializer.
+    # Tables with foreign keys go last: their workers check those keys against
+    # the referenced key sets, so their columns never travel back to this process
     all_valid = True
-    for table_name, schema in SCHEMAS.items():
-        file_name = f"{table_name}.csv"
-        file_path = os.path.join(output_dir, file_name)
+    scans: Dict[str, Dict[str, Any]] = {}
+    dimension_tables = [table for table in SCHEMAS if table not in FOREIGN_KEYS]
+    fact_tables = [table for table in SCHEMAS if table in FOREIGN_KEYS]
+    results = {}
+    
+    max_workers = min(len(SCHEMAS), os.cpu_count() or 1)
+    if max_workers > 1:
+        pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                   initargs=(original_data,))
+    else:
+        # A single worker gains nothing from a separate process
+        pool = None
+        _init_worker(original_data)
+    
+    with pool or nullcontext():
+        run = pool.map if pool else map
+        results.update(zip(dimension_tables, run(
+            _verify_one_table, dimension_tables, [SCHEMAS[table] for table in dimension_tables],
+            repeat(csv_files))))
         
-        if not os.path.exists(file_path):
-            print(f"❌ Error: {file_name} is missing")
+        # Key sets of the referenced tables whose files exist
+        primary_keys = {table: results[table][2]["pk_set"] for table in _REFERENCED_TABLES
+                        if results[table][2] is not None}
+        results.update(zip(fact_tables, run(
+            _verify_one_table, fact_tables, [SCHEMAS[table] for table in fact_tables],
+            repeat(csv_files), repeat(primary_keys))))
+    
+    # Report in schema order, keeping the output deterministic
+    for table_name in SCHEMAS:
+        messages, table_valid, scan = results[table_name]
+        for message in messages:
+            print(message)
+        if not table_valid:
             all_valid = False
-            continue
-        
-        # Verify column sequence matches schema
-        with open(file_path, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            headers = next(reader, None)
-            
-            if headers is None:
-                print(f"❌ Error: {file_name} is empty or has no headers")
-                all_valid = False
-                continue
-            
-            # Check if headers match schema
-            if headers != schema:
-                print(f"❌ Error: Column sequence in {file_name} doesn't match schema")
-                print(f"  Expected: {schema}")
-                print(f"  Found: {headers}")
-                all_valid = False
-                continue
-            
-            # Count rows and verify data against original
-            row_count = 0
-            valid_records = 0
-            invalid_records = 0
-            
-            # Track processed records to check for missing records later
-            processed_ids = set()
-            
-            # Reset file pointer and skip header
-            file.seek(0)
-            next(reader)
-            
-            for row in reader:
-                row_count += 1
-                # Convert row to dict for easier comparison
-                record = {schema[i]: value for i, value in enumerate(row) if i < len(schema)}
-                
-                # Check if record exists in original data
-                if verify_record_in_original(table_name, record, original_data):
-                    valid_records += 1
-                    
-                    # Track the ID of this record for missing record check
-                    id_field = schema[0]  # First field is the ID
-                    if id_field in record:
-                        processed_ids.add(record[id_field])
-                else:
-                    invalid_records += 1
-                    if invalid_records <= 5:  # Limit the number of errors shown
-                        print(f"  ❌ Record not found in original data: {record}")
-            
-            # Print summary for this table
-            print(f"✅ {file_name}: {row_count} rows, {valid_records} valid, {invalid_records} invalid")
-            
-            # Check for missing records from original data
-            check_missing_records(table_name, processed_ids, original_data)
+        if scan is not None:
+            scans[table_name] = scan
     
     # Verify primary key types
-    primary_key_types = verify_primary_key_types(output_dir)
+    primary_key_types = verify_primary_key_types(scans)
     if not primary_key_types:
         all_valid = False
     
     # Verify referential integrity
-    ref_integrity = verify_referential_integrity(output_dir)
+    ref_integrity = verify_referential_integrity(scans)
     if not ref_integrity:
         all_valid = False
     
     return all_valid
 
-def load_original_data() -> Dict[str, List[Dict[str, Any]]]:
+# Original data for the current worker process, set once by _init_worker
+_original_data: Dict[str, Dict[str, Any]] = {}
+
+def _init_worker(original_data: Dict[str, Dict[str, Any]]) -> None:
+    """Make the original data available to the tables verified in this process"""
+    global _original_data
+    _original_data = original_data
+
+def _verify_one_table(table_name: str, schema: List[str], csv_files: Dict[str, str],
+                      primary_keys: Optional[Dict[str, Set[str]]] = None) -> Tuple[List[str], bool, Optional[Dict[str, Any]]]:
+    """Verify one output CSV against its schema and the original data
+    
+    csv_files maps the CSV file names found in the output directory to their paths.
+    primary_keys holds the key sets of the referenced tables, for tables with foreign keys.
+    Returns the report lines, whether the file is structurally valid, and a summary
+    of its keys (primary key type, key set if referenced, foreign key errors),
+    or None if the file is missing.
+    """
+    original_data = _original_data
+    messages = []
+    file_name = f"{table_name}.csv"
+    file_path = csv_files.get(file_name)
+    
+    if file_path is None:
+        messages.append(f"❌ Error: {file_name} is missing")
+        return messages, False, None
+    
+    # Parse the whole file once; the key checks reuse this scan. Only the small
+    # key summary is sent back to the parent process, never the columns
+    scan = scan_output_file(file_path, schema, FOREIGN_KEYS.get(table_name, {}))
+    headers = scan.pop("headers")
+    columns = scan.pop("columns")
+    fk_columns = scan.pop("fk_columns")
+    if table_name not in _REFERENCED_TABLES:
+        del scan["pk_set"]
+    if table_name in FOREIGN_KEYS:
+        scan["fk_errors"] = find_foreign_key_errors(table_name, fk_columns, primary_keys or {})
+    
+    if not headers:
+        messages.append(f"❌ Error: {file_name} is empty or has no headers")
+        return messages, False, scan
+    
+    # Check if headers match schema
+    if headers != schema:
+        messages.append(f"❌ Error: Column sequence in {file_name} doesn't match schema")
+        messages.append(f"  Expected: {schema}")
+        messages.append(f"  Found: {headers}")
+        return messages, False, scan
+    
+    # Check which records exist in original data. Patients need a field-by-field
+    # comparison, other ID tables a bulk set difference, composite keys a per-row lookup
+    ids = columns[_PK_FIELD[table_name]]
+    if table_name == "DimPatient":
+        matches = match_patient_columns(columns, original_data)
+    elif table_name in _ORIGINAL_KEYS:
+        matches = match_id_column(ids, original_data[_ORIGINAL_KEYS[table_name]]["ids"])
+    else:
+        rows = zip(*(columns[field] for field in schema))
+        matches = [verify_record_in_original(table_name, row, original_data) for row in rows]
+    
+    # Count rows and track processed records to check for missing records later
+    row_count = len(ids)
+    valid_records = sum(matches)
+    invalid_records = row_count - valid_records
+    processed_ids = set(compress(ids, matches))
+    
+    # Limit the number of errors shown
+    invalid_rows = (row_index for row_index, is_valid in enumerate(matches) if not is_valid)
+    for row_index in islice(invalid_rows, 5):
+        record = {field: columns[field][row_index] for field in schema}
+        messages.append(f"  ❌ Record not found in original data: {record}")
+    
+    # Summary for this table
+    messages.append(f"✅ {file_name}: {row_count} rows, {valid_records} valid, {invalid_records} invalid")
+    
+    # Check for missing records from original data
+    messages.extend(check_missing_records(table_name, processed_ids, original_data))
+    return messages, True, scan
+
+def composite_keys(columns: Dict[str, Sequence[str]], fields: List[str], require_all: bool) -> List[Optional[Tuple[str, ...]]]:
+    """Build the (a, b, c) key of every source row, or None where the row has no such record"""
+    # The field tuples from zip are the keys themselves, no string formatting needed
+    check = all if require_all else any
+    rows = zip(*(columns[field] for field in fields))
+    return [parts if check(parts) else None for parts in rows]
+
+def build_original_table(keys: Sequence[Optional[str]], columns: Dict[str, Sequence[str]], fields: Sequence[str]) -> Dict[str, Any]:
+    """Build a column-oriented table of original data from the source rows with a key"""
+    # Same result as assigning row by row into a dict: a repeated key keeps
+    # its first position but takes the values of its last row
+    last_rows = dict(zip(keys, range(len(keys))))
+    last_rows.pop('', None)
+    last_rows.pop(None, None)
+    picks = list(last_rows.values())
+    
+    # "ids" maps every key to its row index, "fields" holds one list per column
+    return {
+        "ids": dict(zip(last_rows, range(len(picks)))),
+        "fields": {field: list(map(columns[field].__getitem__, picks)) for field in fields},
+    }
+
+def build_id_table(keys: Sequence[Optional[Hashable]]) -> Dict[str, FrozenSet[Hashable]]:
+    """Build a membership-only table of original data from the source rows with a key"""
+    return {"ids": frozenset(keys).difference(('', None))}
+
+def read_dataset_columns(dataset_path: str, usecols: List[str]) -> Dict[str, Sequence[str]]:
+    """Read the given dataset columns as strings, with columns missing from the file read as empty
+    
+    Uses pyarrow's multithreaded CSV reader when it is installed and the stdlib reader otherwise.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.csv as pa_csv
+    except ImportError:
+        return read_csv_columns(dataset_path, usecols, optional_cols=usecols)[1]
+    
+    # Every column is typed as a string, as the csv module reads it, so IDs are
+    # never inferred as integers and empty or "NA" cells are kept verbatim.
+    # Blank lines are skipped on both paths
+    try:
+        table = pa_csv.read_csv(
+            dataset_path,
+            read_options=pa_csv.ReadOptions(use_threads=True, block_size=1 << 20),
+            parse_options=pa_csv.ParseOptions(newlines_in_values=True, ignore_empty_lines=True),
+            convert_options=pa_csv.ConvertOptions(
+                column_types={name: pa.string() for name in usecols},
+                include_columns=usecols,
+                include_missing_columns=True,
+                strings_can_be_null=False,
+                quoted_strings_can_be_null=False,
+            ),
+        )
+    except pa.ArrowInvalid:
+        # pyarrow rejects rows with the wrong number of fields; the stdlib reader
+        # pads or trims them, so let it read the file instead
+        return read_csv_columns(dataset_path, usecols, optional_cols=usecols)[1]
+    return {name: pc.fill_null(table[name], "").to_pylist() for name in usecols}
+
+def load_original_data() -> Dict[str, Dict[str, Any]]:
     """Load original data from legacy_healthcare_data.csv"""
     # Get the absolute path of the script
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -125,366 +318,176 @@ def load_original_data() -> Dict[str, List[Dict[str, Any]]]:
     print(f"🔍 Loading original data from: {dataset_path}")
     
     try:
-        # Create a dictionary to store original data
+        # Read the schema fields of the original CSV file column-wise in one pass
+        usecols = list(dict.fromkeys(field for schema in SCHEMAS.values() for field in schema))
+        columns = read_dataset_columns(dataset_path, usecols)
+        
+        # Only patients are compared field by field; every other table just needs its IDs
         original_data = {
-            "patients": {},
-            "insurances": {},
-            "billings": {},
-            "providers": {},
-            "locations": {},
-            "primary_diagnoses": {},
-            "secondary_diagnoses": {},
-            "treatments": {},
-            "prescriptions": {},
-            "lab_orders": {},
-            "visits": {}
+            # Store visit data
+            "visits": build_id_table(columns["visit_id"]),
+            # Store patient data (patient_status is derived, not in original data)
+            "patients": build_original_table(columns["patient_id"], columns, _PATIENT_COMPARE_FIELDS),
+            # Store insurance and billing data
+            "insurances": build_id_table(columns["insurance_id"]),
+            "billings": build_id_table(columns["billing_id"]),
         }
         
-        # Read the original CSV file
-        with open(dataset_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            
-            for row in reader:
-                # Store visit data
-                visit_id = row.get('visit_id', '')
-                if visit_id:
-                    original_data["visits"][visit_id] = row
-                
-                # Store patient data
-                patient_id = row.get('patient_id', '')
-                if patient_id:
-                    original_data["patients"][patient_id] = {
-                        'patient_id': patient_id,
-                        'patient_first_name': row.get('patient_first_name', ''),
-                        'patient_last_name': row.get('patient_last_name', ''),
-                        'patient_date_of_birth': row.get('patient_date_of_birth', ''),
-                        'patient_gender': row.get('patient_gender', ''),
-                        'patient_address_line1': row.get('patient_address_line1', ''),
-                        'patient_address_line2': row.get('patient_address_line2', ''),
-                        'patient_city': row.get('patient_city', ''),
-                        'patient_state': row.get('patient_state', ''),
-                        'patient_zip': row.get('patient_zip', ''),
-                        'patient_phone': row.get('patient_phone', ''),
-                        'patient_email': row.get('patient_email', ''),
-                        # Note: patient_status is derived, not in original data
-                    }
-                
-                # Store insurance data
-                insurance_id = row.get('insurance_id', '')
-                if insurance_id:
-                    original_data["insurances"][insurance_id] = {
-                        'insurance_id': insurance_id,
-                        'patient_id': patient_id,
-                        'insurance_payer_name': row.get('insurance_payer_name', ''),
-                        'insurance_policy_number': row.get('insurance_policy_number', ''),
-                        'insurance_group_number': row.get('insurance_group_number', ''),
-                        'insurance_plan_type': row.get('insurance_plan_type', '')
-                    }
-                
-                # Store billing data
-                billing_id = row.get('billing_id', '')
-                if billing_id:
-                    original_data["billings"][billing_id] = {
-                        'billing_id': billing_id,
-                        'insurance_id': insurance_id,
-                        'billing_amount_paid': row.get('billing_amount_paid', ''),
-                        'billing_total_charge': row.get('billing_total_charge', ''),
-                        'billing_date': row.get('billing_date', ''),
-                        'billing_payment_status': row.get('billing_payment_status', '')
-                    }
-                
-                # Store other dimensions based on composite keys
-                doctor_key = f"{row.get('doctor_name', '')}|{row.get('doctor_title', '')}|{row.get('doctor_department', '')}"
-                if all(part for part in doctor_key.split('|')):
-                    original_data["providers"][doctor_key] = {
-                        'doctor_name': row.get('doctor_name', ''),
-                        'doctor_title': row.get('doctor_title', ''),
-                        'doctor_department': row.get('doctor_department', '')
-                    }
-                
-                location_key = f"{row.get('clinic_name', '')}|{row.get('room_number', '')}"
-                if all(part for part in location_key.split('|')):
-                    original_data["locations"][location_key] = {
-                        'clinic_name': row.get('clinic_name', ''),
-                        'room_number': row.get('room_number', '')
-                    }
-                
-                # Store diagnosis data
-                primary_diag_key = f"{row.get('primary_diagnosis_code', '')}|{row.get('primary_diagnosis_desc', '')}"
-                if any(part for part in primary_diag_key.split('|')):
-                    original_data["primary_diagnoses"][primary_diag_key] = {
-                        'primary_diagnosis_code': row.get('primary_diagnosis_code', ''),
-                        'primary_diagnosis_desc': row.get('primary_diagnosis_desc', '')
-                    }
-                
-                secondary_diag_key = f"{row.get('secondary_diagnosis_code', '')}|{row.get('secondary_diagnosis_desc', '')}"
-                if any(part for part in secondary_diag_key.split('|')):
-                    original_data["secondary_diagnoses"][secondary_diag_key] = {
-                        'secondary_diagnosis_code': row.get('secondary_diagnosis_code', ''),
-                        'secondary_diagnosis_desc': row.get('secondary_diagnosis_desc', '')
-                    }
-                
-                # Store treatment data
-                treatment_key = f"{row.get('treatment_code', '')}|{row.get('treatment_desc', '')}"
-                if any(part for part in treatment_key.split('|')):
-                    original_data["treatments"][treatment_key] = {
-                        'treatment_code': row.get('treatment_code', ''),
-                        'treatment_desc': row.get('treatment_desc', '')
-                    }
-                
-                # Store prescription data
-                prescription_id = row.get('prescription_id', '')
-                if prescription_id:
-                    original_data["prescriptions"][prescription_id] = {
-                        'prescription_id': prescription_id,
-                        'prescription_drug_name': row.get('prescription_drug_name', ''),
-                        'prescription_dosage': row.get('prescription_dosage', ''),
-                        'prescription_frequency': row.get('prescription_frequency', ''),
-                        'prescription_duration_days': row.get('prescription_duration_days', '')
-                    }
-                
-                # Store lab order data
-                lab_order_id = row.get('lab_order_id', '')
-                if lab_order_id:
-                    original_data["lab_orders"][lab_order_id] = {
-                        'lab_order_id': lab_order_id,
-                        'lab_test_code': row.get('lab_test_code', ''),
-                        'lab_name': row.get('lab_name', ''),
-                        'lab_result_value': row.get('lab_result_value', ''),
-                        'lab_result_units': row.get('lab_result_units', ''),
-                        'lab_result_date': row.get('lab_result_date', '')
-                    }
+        # Store other dimensions based on composite keys
+        for data_key, table_name, require_all in (
+            ("providers", "DimProvider", True),
+            ("locations", "DimLocation", True),
+            ("primary_diagnoses", "DimPrimaryDiagnosis", False),
+            ("secondary_diagnoses", "DimSecondaryDiagnosis", False),
+            ("treatments", "DimTreatment", False),
+        ):
+            keys = composite_keys(columns, SCHEMAS[table_name][1:], require_all)
+            original_data[data_key] = build_id_table(keys)
+        
+        # Store prescription and lab order data
+        original_data["prescriptions"] = build_id_table(columns["prescription_id"])
+        original_data["lab_orders"] = build_id_table(columns["lab_order_id"])
         
-        print(f"✅ Successfully loaded original data with {len(original_data['visits'])} visits")
+        print(f"✅ Successfully loaded original data with {len(original_data['visits']['ids'])} visits")
         return original_data
     
     except Exception as e:
         print(f"❌ Error loading original data: {str(e)}")
         return None
 
-def verify_record_in_original(table_name: str, record: Dict[str, Any], original_data: Dict[str, Dict[str, Any]]) -> bool:
-    """Verify if a record exists in the original data"""
-    # Map table names to original data keys
-    table_map = {
-        "DimPatient": "patients",
-        "DimInsurance": "insurances",
-        "DimBilling": "billings",
-        "FactVisit": "visits"
-    }
+def verify_record_in_original(table_name: str, row: Sequence[str], original_data: Dict[str, Dict[str, Any]]) -> bool:
+    """Verify if a row of a composite-key table, with values in SCHEMAS[table_name] order, exists in the original data
     
-    # For tables with direct ID mapping
-    if table_name in table_map:
-        data_key = table_map[table_name]
-        id_field = list(record.keys())[0]  # First field is the ID
-        record_id = record[id_field]
-        
-        # Special case for patient status which is derived
-        if table_name == "DimPatient" and "patient_status" in record:
-            # Create a copy of the record without status for comparison
-            record_copy = record.copy()
-            record_copy.pop("patient_status", None)
-            
-            # Check if the patient exists and all other fields match
-            if record_id in original_data[data_key]:
-                orig_record = original_data[data_key][record_id]
-                for key, value in record_copy.items():
-                    if key in orig_record and orig_record[key] != value:
-                        return False
-                return True
-        
-        # For other direct ID tables
-        elif record_id in original_data[data_key]:
-            return True
-    
-    # For tables with composite keys
-    elif table_name in ["DimProvider", "DimLocation", "DimPrimaryDiagnosis", "DimSecondaryDiagnosis", "DimTreatment"]:
-        # Map table names to original data keys and fields
-        composite_map = {
-            "DimProvider": ("providers", ["doctor_name", "doctor_title", "doctor_department"]),
-            "DimLocation": ("locations", ["clinic_name", "room_number"]),
-            "DimPrimaryDiagnosis": ("primary_diagnoses", ["primary_diagnosis_code", "primary_diagnosis_desc"]),
-            "DimSecondaryDiagnosis": ("secondary_diagnoses", ["secondary_diagnosis_code", "secondary_diagnosis_desc"]),
-            "DimTreatment": ("treatments", ["treatment_code", "treatment_desc"])
-        }
-        
-        data_key, fields = composite_map[table_name]
-        
-        # Create composite key from record
-        composite_values = [record.get(field, '') for field in fields if field in record]
-        if not composite_values or not any(composite_values):
-            return False
-            
-        composite_key = "|".join(composite_values)
-        
-        # Check if any original record contains this composite key
-        for key in original_data[data_key]:
-            if composite_key in key:
-                return True
-    
-    # For prescription and lab order tables
-    elif table_name in ["DimPrescription", "DimLabOrder"]:
-        id_field = list(record.keys())[0]  # First field is the ID
-        record_id = record[id_field]
-        
-        data_key = "prescriptions" if table_name == "DimPrescription" else "lab_orders"
-        
-        if record_id in original_data[data_key]:
-            return True
+    Tables keyed by source IDs are checked column-wise by match_patient_columns and match_id_column.
+    """
+    if table_name not in _COMPOSITE_TABLES:
+        return False
     
-    return False
+    data_key, _ = _COMPOSITE_MAP[table_name]
+    
+    # Create composite key from row, indexing the precomputed field positions
+    composite_key = _COMPOSITE_KEY_GETTERS[table_name](row)
+    if not any(composite_key):
+        return False
+    
+    # Keys are built with the same field order in load_original_data
+    return composite_key in original_data[data_key]["ids"]
 
-def verify_primary_key_types(output_dir: str) -> bool:
-    """Verify primary key types (string or integer) for all tables"""
-    # Define primary key column for each table
-    primary_keys = {
-        "DimPatient": "patient_id",
-        "DimInsurance": "insurance_id",
-        "DimBilling": "billing_id",
-        "DimProvider": "provider_id",
-        "DimLocation": "location_id",
-        "DimPrimaryDiagnosis": "primary_diagnosis_id",
-        "DimSecondaryDiagnosis": "secondary_diagnosis_id",
-        "DimTreatment": "treatment_id",
-        "DimPrescription": "prescription_id",
-        "DimLabOrder": "lab_order_id",
-        "FactVisit": "visit_id"
-    }
+def match_id_column(ids: Sequence[str], original_ids: FrozenSet[str]) -> List[bool]:
+    """Check each ID of an output table against the original IDs with one set difference"""
+    unknown = set(ids).difference(original_ids)
+    if not unknown:
+        return [True] * len(ids)
+    return [value not in unknown for value in ids]
+
+def match_patient_columns(columns: Dict[str, Sequence[str]], original_data: Dict[str, Dict[str, Any]]) -> List[bool]:
+    """Check each DimPatient row against the original patient data, one column at a time"""
+    patients = original_data["patients"]
+    patient_ids = columns["patient_id"]
+    if not patients["ids"]:
+        return [False] * len(patient_ids)
     
+    # Unknown patients never match; -1 only keeps the lookups below in range
+    row_indices = list(map(patients["ids"].get, patient_ids, repeat(-1)))
+    matches = [row_index >= 0 for row_index in row_indices]
+    
+    for field in _PATIENT_COMPARE_FIELDS:
+        orig_values = map(patients["fields"][field].__getitem__, row_indices)
+        matches = list(map(and_, matches, map(eq, columns[field], orig_values)))
+    
+    return matches
+
+def verify_primary_key_types(scans: Dict[str, Dict[str, Any]]) -> bool:
+    """Verify primary key types (string or integer) for all tables"""
     all_valid = True
     
-    for table, pk_column in primary_keys.items():
-        file_path = os.path.join(output_dir, f"{table}.csv")
-        
-        if not os.path.exists(file_path):
+    for table, pk_column in _PK_FIELD.items():
+        if table not in scans:
             continue  # Skip if file doesn't exist (already reported)
         
-        with open(file_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            
-            # Check first row to determine primary key type
-            try:
-                first_row = next(reader, None)
-                if first_row and pk_column in first_row:
-                    pk_value = first_row[pk_column]
-                    
-                    # Check if value is integer or string
-                    try:
-                        int(pk_value)
-                        pk_type = "integer"
-                    except ValueError:
-                        pk_type = "string"
-                    
-                    print(f"✅ {table}: Primary key '{pk_column}' is {pk_type} type")
-                else:
-                    print(f"❌ Error: Primary key column '{pk_column}' not found in {table}")
-                    all_valid = False
-            except Exception as e:
-                print(f"❌ Error checking primary key in {table}: {str(e)}")
-                all_valid = False
+        # Type was determined from the first row while scanning the file
+        pk_type = scans[table]["pk_type"]
+        if pk_type:
+            print(f"✅ {table}: Primary key '{pk_column}' is {pk_type} type")
+        else:
+            print(f"❌ Error: Primary key column '{pk_column}' not found in {table}")
+            all_valid = False
     
     return all_valid
 
-def verify_referential_integrity(output_dir: str) -> bool:
-    """Verify referential integrity between fact and dimension tables"""
-    # Define foreign key relationships (table: {fk_column: referenced_table})
-    foreign_keys = {
-        "FactVisit": {
-            "patient_id": "DimPatient",
-            "insurance_id": "DimInsurance",
-            "billing_id": "DimBilling",
-            "provider_id": "DimProvider",
-            "location_id": "DimLocation",
-            "primary_diagnosis_id": "DimPrimaryDiagnosis",
-            "secondary_diagnosis_id": "DimSecondaryDiagnosis",
-            "treatment_id": "DimTreatment",
-            "prescription_id": "DimPrescription",
-            "lab_order_id": "DimLabOrder"
-        }
-    }
+def find_foreign_key_errors(table: str, fk_columns: Dict[str, Sequence[str]], primary_keys: Dict[str, Set[str]]) -> List[str]:
+    """Report every foreign key value in a table that is missing from its referenced table"""
+    fk_relations = FOREIGN_KEYS[table]
     
-    # Load primary keys from dimension tables
-    primary_keys: Dict[str, Set[str]] = {}
-    for table in SCHEMAS.keys():
-        if table == "FactVisit":
+    # Check each foreign key column against its referenced table with one set
+    # difference; only columns holding dangling keys are walked row by row
+    errors = []
+    for position, (fk_column, values) in enumerate(fk_columns.items()):
+        ref_table = fk_relations[fk_column]
+        if ref_table not in primary_keys:
             continue
-            
-        pk_column = SCHEMAS[table][0]  # Assuming first column is primary key
-        file_path = os.path.join(output_dir, f"{table}.csv")
         
-        if not os.path.exists(file_path):
-            continue
-            
-        primary_keys[table] = set()
-        with open(file_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                if pk_column in row and row[pk_column]:
-                    primary_keys[table].add(row[pk_column])
-    
-    # Check foreign keys in fact table
+        dangling = set(values) - primary_keys[ref_table]
+        # Skip empty foreign keys (allowed in snowflake schema)
+        dangling.discard("")
+        if dangling:
+            errors.extend(
+                (row_num, position, fk_column, value, ref_table)
+                for row_num, value in enumerate(values, start=2)  # Start at 2 to account for header
+                if value in dangling
+            )
+    
+    # Report in row order, as a row-by-row scan would
+    return [
+        f"❌ Referential integrity error in {table} row {row_num}: "
+        f"{fk_column}='{value}' not found in {ref_table}"
+        for row_num, _, fk_column, value, ref_table in sorted(errors)
+    ]
+
+def verify_referential_integrity(scans: Dict[str, Dict[str, Any]]) -> bool:
+    """Verify referential integrity between fact and dimension tables"""
+    # Foreign keys were checked by each fact table's worker against the
+    # dimension key sets collected while scanning those files
     all_valid = True
-    for table, fk_relations in foreign_keys.items():
-        file_path = os.path.join(output_dir, f"{table}.csv")
-        
-        if not os.path.exists(file_path):
+    for table in FOREIGN_KEYS:
+        if table not in scans:
             continue
-            
-        with open(file_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            
-            for row_num, row in enumerate(reader, start=2):  # Start at 2 to account for header
-                for fk_column, ref_table in fk_relations.items():
-                    # Skip empty foreign keys (allowed in snowflake schema)
-                    if fk_column not in row or not row[fk_column]:
-                        continue
-                        
-                    # Check if foreign key exists in referenced table
-                    if ref_table in primary_keys and row[fk_column] not in primary_keys[ref_table]:
-                        print(f"❌ Referential integrity error in {table} row {row_num}: "
-                              f"{fk_column}='{row[fk_column]}' not found in {ref_table}")
-                        all_valid = False
+        
+        for message in scans[table]["fk_errors"]:
+            print(message)
+            all_valid = False
     
     if all_valid:
         print("✅ Referential integrity checks passed")
     
     return all_valid
 
-def check_missing_records(table_name: str, processed_ids: Set[str], original_data: Dict[str, Dict[str, Any]]) -> None:
-    """Check if any records from original data are missing in the generated files"""
-    # Map table names to original data keys
-    table_map = {
-        "DimPatient": "patients",
-        "DimInsurance": "insurances",
-        "DimBilling": "billings",
-        "FactVisit": "visits",
-        "DimPrescription": "prescriptions",
-        "DimLabOrder": "lab_orders"
-    }
+def check_missing_records(table_name: str, processed_ids: Set[str], original_data: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Check if any records from original data are missing in the generated files
     
+    Returns the report lines for the table (empty if it cannot be checked).
+    """
     # Only check tables with direct ID mapping
-    if table_name not in table_map:
-        return
-    
-    data_key = table_map[table_name]
-    original_ids = set(original_data[data_key].keys())
+    if table_name not in _ORIGINAL_KEYS:
+        return []
     
-    # For tables with composite keys or derived IDs, we can't easily check for missing records
-    if table_name in ["DimProvider", "DimLocation", "DimPrimaryDiagnosis", 
-                      "DimSecondaryDiagnosis", "DimTreatment"]:
-        return
+    data_key = _ORIGINAL_KEYS[table_name]
+    original_ids = set(original_data[data_key]["ids"])
     
     # Find missing records
     missing_ids = original_ids - processed_ids
     
+    messages = []
     if missing_ids:
-        print(f"  ⚠️ {table_name} is missing {len(missing_ids)} records from original data")
+        messages.append(f"  ⚠️ {table_name} is missing {len(missing_ids)} records from original data")
         if len(missing_ids) <= 5:  # Show only first 5 missing IDs
             for missing_id in list(missing_ids)[:5]:
-                print(f"    - Missing ID: {missing_id}")
+                messages.append(f"    - Missing ID: {missing_id}")
         else:
-            print(f"    - First 5 missing IDs: {list(missing_ids)[:5]}")
+            messages.append(f"    - First 5 missing IDs: {list(missing_ids)[:5]}")
     else:
-        print(f"  ✅ {table_name} contains all records from original data")
+        messages.append(f"  ✅ {table_name} contains all records from original data")
+    return messages
 
 if __name__ == "__main__":
     print("\n🔍 Verifying CSV output files...\n")